@@ -1,25 +1,100 @@
 import streamlit as st
-from groq import Groq
+from groq import Groq, RateLimitError
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import io
 from PIL import Image
-import PyPDF2
+import pypdfium2 as pdfium
+import random
+import re
+import tempfile
+import threading
 import time
-from datetime import datetime
+import uuid
+from pathlib import Path
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 # --- Configuration ---
 st.set_page_config(page_title="BrandGenius Enterprise", layout="wide")
 
+# Guidelines are clipped to this many tokens before they reach Groq (TPM is the binding limit)
+MAX_CONTEXT_TOKENS = 3000
+CHARS_PER_TOKEN = 4  # cheap heuristic for English text
+
+# System prompt for every copy call; filled in once per upload, not per call
+SYSTEM_TEMPLATE = """
+    You are a Senior Brand Strategist. 
+    Strictly adhere to the tone and guidelines below.
+    
+    --- BRAND GUIDELINES ---
+    {ctx}
+    ------------------------
+    
+    Task: Write creative marketing copy.
+    """
+DEFAULT_CONTEXT = "General professional tone."
+
+# Iterate on drafts with the small, fast model; 70B only when finalizing
+COPY_MODELS = {
+    "Fast draft (8B)": "llama-3.1-8b-instant",
+    "Final (70B)": "llama-3.3-70b-versatile",
+}
+FINAL_MODEL = COPY_MODELS["Final (70B)"]
+REFINE_INSTRUCTION = "Refine this draft into final copy. Keep what works; fix anything off-brand."
+
+# Retry budget for Groq rate limiting (429); HF retries live on the session adapter
+MAX_RETRIES = 5
+MAX_BACKOFF_SECONDS = 16  # longest single wait (backoff or Retry-After), Groq and HF alike
+
+# SDXL seeds; the same brief + style + seed is served from cache
+MAX_SEED = 2**32 - 1
+MAX_VARIANTS = 4  # rendered concurrently, so 4 variants take about as long as 1
+
+# Full-size history images live here; session state only keeps paths + thumbnails
+ASSET_DIR = Path(tempfile.gettempdir()) / "brandgenius"
+ASSET_MAX_AGE_SECONDS = 24 * 3600  # older files are pruned whenever an image is saved
+
+# Queued briefs are answered in one Groq call so the guidelines are only sent once
+MAX_BATCH_SIZE = 5
+BATCH_DELIMITER = "==="
+# Only a line holding nothing but the delimiter splits; "Title\n=====" headings don't
+BATCH_DELIMITER_LINE = re.compile(rf"^\s*{re.escape(BATCH_DELIMITER)}\s*$", re.MULTILINE)
+
 # --- 🧠 SESSION STATE (Memory) ---
 # Initialize history list if it doesn't exist
 if "history" not in st.session_state:
     st.session_state.history = []
+    st.session_state.active_item = None  # path of the history image opened at full size
+
+if "image_seed" not in st.session_state:
+    st.session_state.image_seed = random.randint(0, MAX_SEED)
+
+# Briefs waiting for a batch run
+if "queue" not in st.session_state:
+    st.session_state.queue = []
+
+# Last fast draft ({"prompt", "text"}), handed to the 70B model to refine
+if "draft" not in st.session_state:
+    st.session_state.draft = None
+
+# Extracted guideline text survives reruns and tab switches
+if "brand_context" not in st.session_state:
+    st.session_state.brand_context = ""
+    st.session_state.system_instruction = SYSTEM_TEMPLATE.format(ctx=DEFAULT_CONTEXT)
+    st.session_state.brand_pdf_id = None
 
 # --- 🔑 API KEYS ---
 # Checks for keys in Secrets (Cloud) or stops if missing
-if "GROQ_API_KEY" in st.secrets:
-    GROQ_API_KEY = st.secrets["GROQ_API_KEY"]
-else:
+# GROQ_API_KEYS (comma-separated) spreads load across several keys' rate limits
+GROQ_API_KEYS = [
+    key.strip()
+    # `or`, not a .get default: a blank GROQ_API_KEYS must still fall back to GROQ_API_KEY
+    for key in (st.secrets.get("GROQ_API_KEYS") or st.secrets.get("GROQ_API_KEY", "")).split(",")
+    if key.strip()
+]
+if not GROQ_API_KEYS:
     st.error("🚨 Missing GROQ_API_KEY in Streamlit Secrets!")
     st.stop()
 
@@ -30,73 +105,355 @@ else:
     st.stop()
 
 # --- CLIENT SETUP ---
+HF_API_URL = "https://router.huggingface.co/hf-inference/models/stabilityai/stable-diffusion-xl-base-1.0"
+HF_TIMEOUT = (5, 90)  # (connect, read) seconds; SDXL renders can take a while
+
+@st.cache_resource
+def get_groq_clients(groq_api_keys):
+    """
+    One Groq client per key, built once per server process instead of on every rerun.
+    The deque is shared by every session, so rotation goes through the returned lock.
+    """
+    # SDK retries are off: create_chat_completion's rotation + backoff is the only retry layer.
+    # The client at the head of the deque is the one currently in use.
+    clients = deque(Groq(api_key=key, max_retries=0) for key in groq_api_keys)
+    return clients, threading.Lock()
+
+@st.cache_resource
+def get_http_session(hf_api_token):
+    """
+    One pooled session so repeat generations (and their retries) reuse the TLS connection.
+    The adapter retries 503 (SDXL cold start), 429 and gateway errors, honoring
+    Retry-After when sent but capped at MAX_BACKOFF_SECONDS so a large value can't
+    stall the render thread. Otherwise urllib3 waits 0s before the first retry, then
+    2s, 4s, 8s, 16s (+ up to 0.5s jitter each): ~30s, enough to outlast a ~20s
+    cold start, whose 503s usually carry no Retry-After header.
+    """
+    retry = Retry(
+        total=5,
+        connect=2,
+        read=1,  # a read timeout already cost HF_TIMEOUT seconds
+        status=5,
+        backoff_factor=1.0,
+        backoff_jitter=0.5,
+        backoff_max=MAX_BACKOFF_SECONDS,
+        retry_after_max=MAX_BACKOFF_SECONDS,
+        status_forcelist=[429, 502, 503, 504],
+        allowed_methods=["POST"],  # urllib3 skips POST by default
+        raise_on_status=False,     # hand the last response back instead of raising
+    )
+    session = requests.Session()
+    session.headers.update({"Authorization": f"Bearer {hf_api_token}"})
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry))
+    return session
+
 try:
-    client = Groq(api_key=GROQ_API_KEY)
+    groq_clients, groq_rotation_lock = get_groq_clients(tuple(GROQ_API_KEYS))
 except Exception as e:
     st.error(f"Groq Client Error: {e}")
 
-HF_API_URL = "https://router.huggingface.co/hf-inference/models/stabilityai/stable-diffusion-xl-base-1.0"
-hf_headers = {"Authorization": f"Bearer {HF_API_TOKEN}"}
+hf_session = get_http_session(HF_API_TOKEN)
+
+@st.cache_resource
+def get_pdfium_lock():
+    """
+    PDFium is not thread-safe, even across separate documents, and every session
+    runs in its own thread: all PDFium work goes through this process-wide lock.
+    """
+    return threading.Lock()
 
 # --- HELPER FUNCTIONS ---
 
-def extract_text_from_pdf(uploaded_file):
-    try:
-        pdf_reader = PyPDF2.PdfReader(uploaded_file)
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
+# Memory only, on purpose: persist="disk" pickles would never be evicted, piling up
+# every user's (possibly confidential) guidelines in the cache dir across restarts.
+@st.cache_data(show_spinner=False, max_entries=32, ttl=3600)
+def extract_text_from_pdf(file_bytes: bytes) -> str:
+    """
+    Parses the PDF once per upload; Streamlit keys the cache on the bytes.
+    Raises on unreadable files so that failures are never cached.
+    """
+    # PDFium (C) instead of PyPDF2's pure-Python content-stream parsing
+    with get_pdfium_lock():
+        pdf = pdfium.PdfDocument(file_bytes)
+        try:
+            parts = [pdf[i].get_textpage().get_text_range() for i in range(len(pdf))]
+        finally:
+            pdf.close()
+    return "\n".join(parts)
+
+def make_thumbnail(image_bytes, max_side, quality):
+    """Re-encodes an image as a JPEG whose longest edge is at most max_side."""
+    img = Image.open(io.BytesIO(image_bytes))
+    img.thumbnail((max_side, max_side), Image.LANCZOS)
+    buf = io.BytesIO()
+    img.convert("RGB").save(buf, "JPEG", quality=quality, optimize=True)
+    return buf.getvalue()
+
+def to_webp(image_bytes):
+    """
+    Re-encodes an image as WebP q90, typically a quarter to a third smaller than PNG
+    on disk and as a download. (st.image re-encodes it again for display.)
+    """
+    buf = io.BytesIO()
+    Image.open(io.BytesIO(image_bytes)).save(buf, "WEBP", quality=90, method=6)
+    return buf.getvalue()
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def preview_moodboard(image_bytes):
+    """Small cached preview of the uploaded moodboard."""
+    return make_thumbnail(image_bytes, max_side=512, quality=85)
+
+def clip_to_token_budget(text, max_tokens=MAX_CONTEXT_TOKENS):
+    """
+    Trims text to roughly max_tokens so we don't pay for unused prefix tokens.
+    Cuts at the last paragraph, sentence or line break inside the budget so the
+    model never sees half a guideline.
+    """
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
         return text
-    except Exception as e:
-        return f"Error reading PDF: {e}"
+    clipped = text[:limit]
+    for separator in ("\n\n", ". ", "\n"):
+        cut = clipped.rfind(separator)
+        if cut >= limit // 2:  # a clean cut isn't worth losing half the budget
+            return clipped[:cut + len(separator)].rstrip()
+    return clipped
 
-def generate_brand_aware_copy(prompt, context_text):
-    """Generates copy using Llama 3 with context."""
-    system_instruction = f"""
-    You are a Senior Brand Strategist. 
-    Strictly adhere to the tone and guidelines below.
-    
-    --- BRAND GUIDELINES ---
-    {context_text[:10000]} 
-    ------------------------
-    
-    Task: Write creative marketing copy.
+def backoff_delay(attempt, retry_after=None):
+    """Seconds to wait before the next retry: Retry-After if the server sent one, else exponential + jitter."""
+    if retry_after:
+        try:
+            return min(float(retry_after), MAX_BACKOFF_SECONDS)
+        except ValueError:
+            pass  # HTTP-date form, fall back to our own schedule
+    return min(2 ** attempt + random.random() * 0.5, MAX_BACKOFF_SECONDS)
+
+def create_chat_completion(**kwargs):
+    """
+    Groq chat call that survives rate limiting (429).
+    Rotates to the next API key straight away; once every key is limited, backs off.
+    """
+    for attempt in range(MAX_RETRIES):
+        for _ in range(len(groq_clients)):
+            client = groq_clients[0]
+            try:
+                # A key that succeeds stays at the head for the next call
+                return client.chat.completions.create(**kwargs)
+            except RateLimitError as e:
+                rate_limit_error = e
+                with groq_rotation_lock:
+                    # Another session may already have rotated past this key
+                    if groq_clients[0] is client:
+                        groq_clients.rotate(-1)
+        if attempt < MAX_RETRIES - 1:
+            time.sleep(backoff_delay(attempt, rate_limit_error.response.headers.get("retry-after")))
+    raise rate_limit_error
+
+def set_brand_context(text):
+    """
+    Stores the extracted guidelines and pre-builds the system prompt from them.
+    Sending byte-identical prompts also lets Groq's prefix cache hit across calls.
+    """
+    st.session_state.brand_context = text
+    clipped = clip_to_token_budget(text)
+    st.session_state.system_instruction = SYSTEM_TEMPLATE.format(ctx=clipped or DEFAULT_CONTEXT)
+
+def build_copy_messages(prompt, system_instruction, draft=None):
+    """Chat messages for one brief; a previous draft is passed back for the model to refine."""
+    messages = [
+        {"role": "system", "content": system_instruction},
+        {"role": "user", "content": prompt}
+    ]
+    if draft:
+        messages += [
+            {"role": "assistant", "content": draft},
+            {"role": "user", "content": REFINE_INSTRUCTION}
+        ]
+    return messages
+
+def generate_brand_aware_copy(prompt, system_instruction, model=FINAL_MODEL, draft=None):
     """
+    Streams copy from Llama 3 under the brand system prompt, yielding text deltas.
+    Raises on failure, possibly after some deltas were already yielded.
+    """
+    completion = create_chat_completion(
+        model=model,
+        messages=build_copy_messages(prompt, system_instruction, draft),
+        temperature=0.6,
+        max_tokens=1500,
+        stream=True,
+    )
+    for chunk in completion:
+        yield chunk.choices[0].delta.content or ""
+
+@st.cache_data(show_spinner=False, ttl=3600, max_entries=128)
+def generate_deterministic_copy(prompt, system_instruction, model=FINAL_MODEL, draft=None):
+    """
+    Copy at temperature 0 with a fixed seed, so a repeated brief is served from cache.
+    Raises on failure so that errors are never cached.
+    """
+    completion = create_chat_completion(
+        model=model,
+        messages=build_copy_messages(prompt, system_instruction, draft),
+        temperature=0,
+        seed=42,
+        max_tokens=1500,
+    )
+    return completion.choices[0].message.content
+
+def generate_batch_copy(briefs, system_instruction, model=FINAL_MODEL):
+    """
+    Writes copy for several briefs in a single Groq call.
+    Returns one deliverable per brief, or None if the answer can't be split reliably.
+    """
+    numbered_briefs = "\n".join(f"{n}) {brief}" for n, brief in enumerate(briefs, start=1))
+    user_message = (
+        f"Write one deliverable for each of the {len(briefs)} briefs below, in the same order.\n"
+        f"Separate deliverables with a line containing only {BATCH_DELIMITER} and add nothing else.\n\n"
+        f"{numbered_briefs}"
+    )
+    completion = create_chat_completion(
+        model=model,
+        messages=[
+            {"role": "system", "content": system_instruction},
+            {"role": "user", "content": user_message}
+        ],
+        temperature=0.6,
+        max_tokens=1500 * len(briefs),
+    )
+    content = completion.choices[0].message.content
+    parts = [part.strip() for part in BATCH_DELIMITER_LINE.split(content) if part.strip()]
+    if len(parts) != len(briefs):
+        return None
+    # Drop only an echo of the brief's own "n) " marker, never a list the copy starts with
+    return [re.sub(rf"^\s*{n}\)\s*", "", part, count=1) for n, part in enumerate(parts, start=1)]
+
+@st.cache_data(show_spinner=False, max_entries=64, ttl=3600)
+def render_image(enhanced_prompt, seed):
+    """
+    Cached SDXL call, returning WebP bytes (encoded once, here, for history and
+    download). Raises RuntimeError on any failure so that errors are never cached.
+    """
+    payload = {"inputs": enhanced_prompt, "parameters": {"seed": seed}}
+    response = hf_session.post(HF_API_URL, json=payload, timeout=HF_TIMEOUT)
+    if response.status_code != 200:
+        raise RuntimeError(f"Image generation failed (HTTP {response.status_code})")
     try:
-        completion = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[
-                {"role": "system", "content": system_instruction},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.6,
-            max_tokens=1500,
-        )
-        return completion.choices[0].message.content
-    except Exception as e:
-        return f"Error: {e}"
-
-def generate_image_huggingface(prompt, style_context=""):
+        return to_webp(response.content)
+    except (OSError, ValueError) as e:  # e.g. a 200 whose body isn't an image
+        raise RuntimeError(f"Image generation returned an unreadable image: {e}") from e
+
+def generate_image_huggingface(prompt, style_context="", seed=None):
     """
     Standard Stable Diffusion XL Generation.
     Reverted to simple prompt concatenation for better control.
+    Repeat calls with the same seed are free; pass a new seed (or none) to re-roll.
     """
     enhanced_prompt = f"{prompt}, {style_context}"
-    payload = {"inputs": enhanced_prompt}
-    
-    for attempt in range(3):
+    if seed is None:
+        seed = random.randint(0, MAX_SEED)
+    try:
+        return render_image(enhanced_prompt, seed)
+    except (requests.exceptions.RequestException, RuntimeError):
+        return None
+
+def generate_image_variants(prompt, style_context, seed, count):
+    """
+    Renders count variants (consecutive seeds) at the same time.
+    Each request mostly waits on HF, so wall time is roughly that of the slowest one.
+    """
+    seeds = [(seed + i) % (MAX_SEED + 1) for i in range(count)]
+    with ThreadPoolExecutor(max_workers=count) as pool:
+        return list(pool.map(lambda s: generate_image_huggingface(prompt, style_context, s), seeds))
+
+def open_history_item(path):
+    """Button callback: marks a history image as the one to offer for download."""
+    st.session_state.active_item = path
+
+def reroll_seed():
+    """Button callback: a new seed means the next render misses the cache."""
+    st.session_state.image_seed = random.randint(0, MAX_SEED)
+
+def write_copy(prompt, model=FINAL_MODEL, deterministic=False):
+    """
+    Shows copy for a brief and returns its text (streamed, or cached when deterministic).
+    Finalizing a brief that has a fast draft refines that draft instead of starting over.
+    """
+    draft = st.session_state.draft
+    draft_text = draft["text"] if model == FINAL_MODEL and draft and draft["prompt"] == prompt else None
+
+    failed = False
+
+    def stream_copy():
+        nonlocal failed
         try:
-            response = requests.post(HF_API_URL, headers=hf_headers, json=payload)
-            if response.status_code == 200:
-                return response.content
-            elif response.status_code == 503:
-                time.sleep(4)
-                continue
-            else:
-                return None
-        except:
-            return None
-    return None
+            yield from generate_brand_aware_copy(prompt, st.session_state.system_instruction, model, draft_text)
+        except Exception as e:
+            # The stream may already have produced part of the copy
+            failed = True
+            yield f"Error: {e}"
+
+    st.markdown("### 📝 Strategic Copy")
+    if not deterministic:
+        # Tokens are painted as they arrive; write_stream returns the full text
+        res = st.write_stream(stream_copy())
+    else:
+        try:
+            res = generate_deterministic_copy(prompt, st.session_state.system_instruction, model, draft_text)
+        except Exception as e:
+            failed = True
+            res = f"Error: {e}"
+        st.markdown(res)
+
+    # Only a complete draft is worth handing to the 70B model to refine
+    if model != FINAL_MODEL and not failed:
+        st.session_state.draft = {"prompt": prompt, "text": res}
+    return res
+
+def show_visuals(prompt, images):
+    """Shows rendered variants side by side and saves them to history."""
+    rendered = [image_bytes for image_bytes in images if image_bytes]
+    if not rendered:
+        st.error("Generation failed. Try again.")
+        return
+    st.markdown("### 🎨 Campaign Visual")
+    timestamp = time.strftime("%H:%M", time.localtime())
+    for col, image_bytes in zip(st.columns(len(rendered)), rendered):
+        col.image(image_bytes, use_container_width=True)
+        add_to_history("image", prompt, image_bytes, timestamp)
+    if len(rendered) < len(images):
+        st.warning(f"{len(images) - len(rendered)} of {len(images)} variants failed.")
+
+def prune_assets(max_age=ASSET_MAX_AGE_SECONDS):
+    """Deletes saved images older than max_age; the directory is shared by every session."""
+    cutoff = time.time() - max_age
+    for path in ASSET_DIR.glob("*"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except FileNotFoundError:
+            pass  # another session pruned it first
+
+def add_to_history(kind, prompt, content, timestamp=None):
+    """
+    Saves a generated asset to the session's Campaign History.
+    Images go to a temp file so session state only holds their path and a
+    small thumbnail, not MBs of image data.
+    Pass timestamp when saving several assets from one run so they share it.
+    """
+    if timestamp is None:
+        timestamp = time.strftime("%H:%M", time.localtime())
+    item = {"type": kind, "prompt": prompt, "time": timestamp}
+    if kind == "image":
+        ASSET_DIR.mkdir(parents=True, exist_ok=True)
+        prune_assets()
+        path = ASSET_DIR / f"{uuid.uuid4().hex}.webp"
+        path.write_bytes(content)
+        item["path"] = str(path)
+        item["thumb"] = make_thumbnail(content, max_side=256, quality=75)
+    else:
+        item["content"] = content
+    st.session_state.history.append(item)
 
 # --- MAIN PAGE LAYOUT ---
 
@@ -118,11 +475,24 @@ with tab1:
         # PDF Upload
         st.subheader("📄 Strategy & Guidelines")
         uploaded_pdf = st.file_uploader("Upload Brand Guidelines (PDF)", type="pdf")
-        brand_context = ""
         if uploaded_pdf:
-            with st.status("Processing Document..."):
-                brand_context = extract_text_from_pdf(uploaded_pdf)
+            # Only show the processing status for a newly uploaded file
+            if st.session_state.brand_pdf_id != uploaded_pdf.file_id:
+                with st.status("Processing Document..."):
+                    try:
+                        set_brand_context(extract_text_from_pdf(uploaded_pdf.getvalue()))
+                        st.session_state.brand_pdf_id = uploaded_pdf.file_id
+                    except Exception as e:
+                        # Don't keep writing against a previous (or half-read) deck
+                        set_brand_context("")
+                        st.session_state.brand_pdf_id = None
+                        st.error(f"Error reading PDF: {e}")
+            if st.session_state.brand_pdf_id == uploaded_pdf.file_id:
                 st.success("Knowledge Base Updated!")
+        elif st.session_state.brand_pdf_id is not None:
+            # PDF was removed: fall back to the generic tone
+            set_brand_context("")
+            st.session_state.brand_pdf_id = None
 
         st.divider()
 
@@ -130,18 +500,53 @@ with tab1:
         st.subheader("🖼️ Visual Style Reference")
         uploaded_img = st.file_uploader("Upload Moodboard", type=["jpg", "png"])
         if uploaded_img:
-            st.image(uploaded_img, caption="Reference Image", use_container_width=True)
+            # Phone/camera moodboards can be 10MB+; the column is only a few hundred px wide
+            st.image(preview_moodboard(uploaded_img.getvalue()), caption="Reference Image", use_container_width=True)
             
         # Manual Style Input (Simple & Reliable)
         visual_style_desc = st.text_input("Describe style:", value="Minimalist, High Contrast, Luxury, 4k")
 
+        # Same brief + style + seed returns the previous render instantly
+        s1, s2 = st.columns([3, 1])
+        image_seed = s1.number_input("Seed", min_value=0, max_value=MAX_SEED, step=1, key="image_seed")
+        s2.button("🎲 Re-roll", on_click=reroll_seed, use_container_width=True)
+        num_variants = st.slider("Variants", min_value=1, max_value=MAX_VARIANTS, value=1)
+
     with col_right:
         st.header("2. Creation Studio")
         user_prompt = st.text_area("Campaign Brief", height=150, placeholder="e.g., Launch a new organic coffee line...")
+        quality = st.selectbox("Quality", list(COPY_MODELS),
+                               help="Iterate with the fast model, then switch to Final to polish the last draft.")
+        copy_model = COPY_MODELS[quality]
 
         c1, c2 = st.columns(2)
         do_text = c1.button("✍️ Generate On-Brand Copy", type="primary", use_container_width=True)
         do_img = c2.button("🎨 Generate On-Brand Visuals", type="secondary", use_container_width=True)
+        do_campaign = st.button("🚀 Generate Full Campaign", use_container_width=True)
+        deterministic = st.checkbox("Deterministic (cacheable)",
+                                    help="Temperature 0 with a fixed seed: re-running the same brief is instant.")
+
+        # Batch mode: queue several briefs, then write them all in one call
+        q1, q2 = st.columns(2)
+        do_queue = q1.button("➕ Queue Brief", use_container_width=True,
+                             disabled=len(st.session_state.queue) >= MAX_BATCH_SIZE)
+        do_batch = q2.button(f"📦 Run Batch ({len(st.session_state.queue)})", use_container_width=True,
+                             disabled=not st.session_state.queue)
+
+        if do_queue:
+            if not user_prompt:
+                st.warning("Please enter a brief.")
+            else:
+                st.session_state.queue.append(user_prompt)
+                st.rerun()
+
+        if st.session_state.queue:
+            with st.expander(f"Queued briefs ({len(st.session_state.queue)}/{MAX_BATCH_SIZE})"):
+                for n, brief in enumerate(st.session_state.queue, start=1):
+                    st.markdown(f"{n}. {brief}")
+                if st.button("Clear Queue"):
+                    st.session_state.queue = []
+                    st.rerun()
 
         st.divider()
 
@@ -151,19 +556,10 @@ with tab1:
                 st.warning("Please enter a brief.")
             else:
                 with st.spinner("Writing copy..."):
-                    final_context = brand_context if brand_context else "General professional tone."
-                    res = generate_brand_aware_copy(user_prompt, final_context)
-                    
-                    st.markdown("### 📝 Strategic Copy")
-                    st.markdown(res)
+                    res = write_copy(user_prompt, copy_model, deterministic)
                     
                     # Save to History
-                    st.session_state.history.append({
-                        "type": "text", 
-                        "prompt": user_prompt, 
-                        "content": res, 
-                        "time": datetime.now().strftime("%H:%M")
-                    })
+                    add_to_history("text", user_prompt, res)
 
         # Logic for IMAGE Generation
         if do_img:
@@ -171,26 +567,51 @@ with tab1:
                 st.warning("Please enter a brief.")
             else:
                 with st.spinner("Rendering visuals..."):
-                    image_bytes = generate_image_huggingface(user_prompt, visual_style_desc)
-                    
-                    if image_bytes:
-                        st.markdown("### 🎨 Campaign Visual")
-                        generated_img = Image.open(io.BytesIO(image_bytes))
-                        st.image(generated_img, use_container_width=True)
-                        
-                        # Save to History
-                        st.session_state.history.append({
-                            "type": "image", 
-                            "prompt": user_prompt, 
-                            "content": image_bytes,
-                            "time": datetime.now().strftime("%H:%M")
-                        })
-                    else:
-                        st.error("Generation failed. Try again.")
+                    images = generate_image_variants(user_prompt, visual_style_desc, image_seed, num_variants)
+                    show_visuals(user_prompt, images)
+
+        # Logic for FULL CAMPAIGN (copy + visual together)
+        if do_campaign:
+            if not user_prompt:
+                st.warning("Please enter a brief.")
+            else:
+                # Both calls just wait on the network, so run them side by side:
+                # SDXL renders in the background while the copy streams in here
+                with ThreadPoolExecutor(max_workers=1) as pool:
+                    img_future = pool.submit(generate_image_variants, user_prompt, visual_style_desc, image_seed, num_variants)
+
+                    res = write_copy(user_prompt, copy_model, deterministic)
+                    add_to_history("text", user_prompt, res)
+
+                    with st.spinner("Rendering visuals..."):
+                        images = img_future.result()
+
+                show_visuals(user_prompt, images)
+
+        # Logic for BATCH Generation
+        if do_batch:
+            briefs = st.session_state.queue
+            with st.spinner(f"Writing copy for {len(briefs)} briefs..."):
+                try:
+                    deliverables = generate_batch_copy(briefs, st.session_state.system_instruction, copy_model)
+                except Exception as e:
+                    deliverables = None
+                    st.error(f"Error: {e}")
+
+            if deliverables:
+                timestamp = time.strftime("%H:%M", time.localtime())
+                for brief, res in zip(briefs, deliverables):
+                    st.markdown(f"### 📝 {brief[:50]}")
+                    st.markdown(res)
+                    add_to_history("text", brief, res, timestamp)
+                st.session_state.queue = []
+            else:
+                st.error("Batch generation failed. Your queue was kept, try again.")
 
 # 3. FILL TAB 2 (The History)
-with tab2:
-    # Everything indented here goes into Tab 2
+@st.fragment
+def render_history():
+    """History tab body. Clicks in here rerun only this fragment, not the Workstation."""
     st.header("🗄️ Session History")
     
     if len(st.session_state.history) == 0:
@@ -202,6 +623,18 @@ with tab2:
             if item['type'] == 'text':
                 st.markdown(item['content'])
             elif item['type'] == 'image':
-                img = Image.open(io.BytesIO(item['content']))
-                st.image(img, use_container_width=True)
-                st.download_button("Download", data=item['content'], file_name=f"history_{i}.png", mime="image/png", key=f"dl_{i}")
+                # A few KB per rerun instead of the full-size image
+                st.image(item['thumb'])
+                # Full resolution is only read back from disk for the download the user asked for
+                if not Path(item['path']).exists():
+                    st.caption("Full-size file has expired.")
+                elif st.session_state.active_item == item['path']:
+                    full_bytes = Path(item['path']).read_bytes()
+                    st.download_button("Download", data=full_bytes, file_name=f"history_{i}.webp", mime="image/webp", key=f"dl_{i}")
+                else:
+                    # The callback runs before the fragment reruns, which then shows the download
+                    st.button("Get Full Size", key=f"open_{i}", on_click=open_history_item, args=(item['path'],))
+
+with tab2:
+    # Everything indented here goes into Tab 2
+    render_history()